@@ -50,33 +50,322 @@ In your expense report, what is the product of the three entries that sum to 202
 Your puzzle answer was 111605670.
 """
 
+from itertools import combinations
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import sys
+
+import numpy as np
+
 import advent_utils
 
+TARGET = 2020
+
+FFT_MIN_ENTRIES = 2000
+FFT_MAX_SPAN = 1 << 22
+
 
 def puzzle_1(input_numbers):
-    answers = set()
-    for x in range(0, len(input_numbers)):
-        for y in range(0, len(input_numbers)):
-            if x != y and (input_numbers[x] + input_numbers[y] == 2020):
-                answers.add(input_numbers[x] * input_numbers[y])
+    pair = find_pair(input_numbers, TARGET)
+    if pair is None:
+        return None
+
+    return pair[0] * pair[1]
+
+
+def puzzle_2(input_numbers, processes=1):
+    # The pool only pays off for the quadratic fallback; reports find_triple_fft accepts are faster serially.
+    if processes > 1 and not uses_triple_fft(input_numbers):
+        triple = find_triple_parallel(input_numbers, TARGET, processes)
+    else:
+        triple = find_k_sum(input_numbers, 3, TARGET)
+    if triple is None:
+        return None
+
+    return math.prod(triple)
+
+
+def iter_pairs(numbers, target):
+    # Yields each pair of entries adding up to target as soon as its second entry is seen.
+    seen = set()
+    for number in numbers:
+        complement = target - number
+        if complement in seen:
+            yield complement, number
+        seen.add(number)
+
+
+def find_pair(numbers, target):
+    return next(iter_pairs(numbers, target), None)
+
+
+def find_all_pairs(numbers, target):
+    pairs = set()
+    for x, y in iter_pairs(numbers, target):
+        pairs.add((min(x, y), max(x, y)))
+
+    return sorted(pairs)
+
+
+def find_k_sum(sorted_numbers, k, target=TARGET):
+    # sorted_numbers must be in ascending order; returns k entries (at distinct positions) adding up to target.
+    if k < 1 or k > len(sorted_numbers):
+        return None
+    if k == 1:
+        return (target,) if target in set(sorted_numbers) else None
+    if k == 2:
+        return find_pair(sorted_numbers, target)
+    if k == 3:
+        return find_triple(sorted_numbers, target)
+
+    return find_k_sum_meet_in_the_middle(sorted_numbers, k, target)
+
+
+def find_triple(sorted_numbers, target):
+    # The two-pointer scan is O(n^2) in the worst case: 100k distinct entries with no match and sums close to the
+    # target take minutes. Large reports whose values span at most FFT_MAX_SPAN go through find_triple_fft instead.
+    size = len(sorted_numbers)
+    if uses_triple_fft(sorted_numbers):
+        return find_triple_fft(sorted_numbers, target)
+
+    for x in range(0, size - 2):
+        first = sorted_numbers[x]
+        if x > 0 and first == sorted_numbers[x - 1]:
+            continue
+        if first + sorted_numbers[x + 1] + sorted_numbers[x + 2] > target:
+            break
+        if first + sorted_numbers[size - 2] + sorted_numbers[size - 1] < target:
+            continue
+
+        pair = find_sorted_pair(sorted_numbers, x + 1, size - 1, target - first)
+        if pair is not None:
+            return (first,) + pair
+
+    return None
+
+
+def uses_triple_fft(sorted_numbers):
+    return len(sorted_numbers) >= FFT_MIN_ENTRIES and sorted_numbers[-1] - sorted_numbers[0] <= FFT_MAX_SPAN
+
+
+def find_triple_fft(sorted_numbers, target):
+    # O(n + span * log(span)): the FFT pair-sum table says, for every entry, how many pairs add up to the rest of the
+    # target. Pairs that reuse the entry itself are discounted; the first entry left over is completed by find_pair.
+    values = np.asarray(sorted_numbers, dtype=np.int64)
+    counts, lowest_sum = load_pair_sum_counts(values)
+
+    idx = target - values - lowest_sum
+    in_range = (idx >= 0) & (idx < len(counts))
+    pairs = np.where(in_range, counts[np.clip(idx, 0, len(counts) - 1)], 0)
+
+    partner = target - 2 * values
+    own_pairs = np.searchsorted(values, partner, side='right') - np.searchsorted(values, partner, side='left') \
+        - (partner == values)
+
+    candidates = np.flatnonzero(pairs > own_pairs)
+    if len(candidates) == 0:
+        return None
+
+    x = candidates[0]
+    pair = find_pair(np.delete(values, x).tolist(), int(target - values[x]))
+
+    return tuple(sorted((int(values[x]),) + pair))
+
+
+def find_triple_parallel(sorted_numbers, target, processes=None, chunk_size=None):
+    # Splits the outer index range of find_triple across a process pool. The sorted entries are copied once into
+    # shared memory and every worker stops as soon as any of them has found a match.
+    size = len(sorted_numbers)
+    if size < 3:
+        return None
+
+    processes = processes or multiprocessing.cpu_count()
+    chunk_size = chunk_size or max(1, size // (processes * 16))
+    chunks = [(start, min(start + chunk_size, size - 2), target) for start in range(0, size - 2, chunk_size)]
+
+    shm = shared_memory.SharedMemory(create=True, size=size * 8)
+    try:
+        shared_numbers = np.ndarray((size,), dtype=np.int64, buffer=shm.buf)
+        shared_numbers[:] = sorted_numbers
+        del shared_numbers
+
+        found = multiprocessing.Event()
+        with multiprocessing.Pool(processes, initializer=_init_triple_worker, initargs=(shm.name, found)) as pool:
+            for triple in pool.imap_unordered(_search_triple_chunk, chunks):
+                if triple is not None:
+                    found.set()
+                    return triple
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return None
+
+
+def _init_triple_worker(shm_name, found):
+    global _worker_shm, _worker_numbers, _worker_found
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_numbers = np.ndarray((_worker_shm.size // 8,), dtype=np.int64, buffer=_worker_shm.buf)
+    _worker_found = found
+
+
+def _search_triple_chunk(chunk):
+    # For each outer entry, every candidate second entry (up to half the rest of the target) is looked up at once
+    # with searchsorted; the last copy of its complement must sit after it.
+    start, stop, target = chunk
+    numbers = _worker_numbers
+    size = len(numbers)
+    last = int(numbers[size - 2]) + int(numbers[size - 1])
+
+    for x in range(start, stop):
+        if _worker_found.is_set():
+            return None
+
+        first = int(numbers[x])
+        if x > 0 and first == numbers[x - 1]:
+            continue
+        if first + int(numbers[x + 1]) + int(numbers[x + 2]) > target:
+            return None
+        if first + last < target:
+            continue
+
+        rest = target - first
+        second_stop = int(np.searchsorted(numbers, rest // 2, side='right'))
+        if second_stop <= x + 1:
+            continue
+
+        seconds = numbers[x + 1: second_stop]
+        complements = rest - seconds
+        thirds = np.searchsorted(numbers, complements, side='right') - 1
+        matches = np.flatnonzero((numbers[thirds] == complements) & (thirds > np.arange(x + 1, second_stop)))
+        if len(matches):
+            _worker_found.set()
+            second = int(seconds[matches[0]])
+            return first, second, rest - second
+
+    return None
+
+
+def find_sorted_pair(sorted_numbers, low, high, target):
+    # Two-pointer search over sorted_numbers[low:high + 1].
+    while low < high:
+        total = sorted_numbers[low] + sorted_numbers[high]
+        if total == target:
+            return sorted_numbers[low], sorted_numbers[high]
+        if total < target:
+            low += 1
+        else:
+            high -= 1
+
+    return None
+
+
+def find_k_sum_meet_in_the_middle(sorted_numbers, k, target):
+    # Every k-combination is split at its k_low-th index: the lower half comes from the sums table built so far,
+    # the upper half starts at the split index, so each combination is looked at exactly once.
+    k_low = k // 2
+    k_high = k - k_low
+    size = len(sorted_numbers)
+    low_sums = {}
+
+    for split in range(k_low, size - k_high + 1):
+        for head in combinations(range(0, split - 1), k_low - 1):
+            low_half = head + (split - 1,)
+            low_sums.setdefault(sum(sorted_numbers[i] for i in low_half), low_half)
+
+        for tail in combinations(range(split + 1, size), k_high - 1):
+            high_half = (split,) + tail
+            low_half = low_sums.get(target - sum(sorted_numbers[i] for i in high_half))
+            if low_half is not None:
+                return tuple(sorted_numbers[i] for i in low_half + high_half)
+
+    return None
+
+
+def find_pair_blocked(numbers, target, max_tile_bytes=64 * 1024 * 1024):
+    # Broadcasts pair sums tile by tile over the upper triangle, so the working memory stays within max_tile_bytes
+    # whatever the report size or number of matches (on top of the int64 copy of the report itself): each tile
+    # element costs 10 bytes, its int64 sum and its bool match, plus the previous tile's match that is only released
+    # once the new one exists.
+    values = np.asarray(numbers, dtype=np.int64)
+    size = len(values)
+    tile = max(1, math.isqrt(max_tile_bytes // 10))
+
+    for row_start in range(0, size, tile):
+        rows = values[row_start: row_start + tile]
+        for col_start in range(row_start, size, tile):
+            cols = values[col_start: col_start + tile]
+            matches = (rows[:, None] + cols[None, :]) == target
+            if col_start == row_start:
+                # Keep only pairs above the diagonal, masking in place once the int64 sums have been freed.
+                matches &= np.arange(len(cols))[None, :] > np.arange(len(rows))[:, None]
+
+            # argmax finds the first hit without allocating every hit's coordinates.
+            first_hit = int(matches.argmax())
+            if matches.flat[first_hit]:
+                x, y = divmod(first_hit, matches.shape[1])
+                return int(rows[x]), int(cols[y])
+
+    return None
+
+
+def load_pair_sum_counts(numbers):
+    # Number of unordered pairs (at distinct positions) for every possible sum, computed once with an FFT
+    # self-convolution of the value frequencies. Returns the counts and the sum stored at index 0. Tables are sized by
+    # the value span, so reports spanning more than FFT_MAX_SPAN raise ValueError.
+    values = np.asarray(numbers, dtype=np.int64)
+    low = int(values.min())
+    span = int(values.max()) - low
+    if span > FFT_MAX_SPAN:
+        raise ValueError('Values span {s}, more than the FFT_MAX_SPAN of {m}'.format(s=span, m=FFT_MAX_SPAN))
+
+    frequencies = np.bincount(values - low)
+
+    sums_size = 2 * len(frequencies) - 1
+    fft_size = 1 << (sums_size - 1).bit_length()
+    spectrum = np.fft.rfft(frequencies, fft_size)
+    ordered_pairs = np.rint(np.fft.irfft(spectrum * spectrum, fft_size)[:sums_size]).astype(np.int64)
+
+    # Drop each entry paired with itself, then count every pair once instead of twice.
+    ordered_pairs[::2] -= frequencies
+
+    return ordered_pairs // 2, 2 * low
+
+
+def count_pairs(pair_sum_counts, target):
+    counts, lowest_sum = pair_sum_counts
+    idx = target - lowest_sum
+    if idx < 0 or idx >= len(counts):
+        return 0
+
+    return int(counts[idx])
+
+
+def count_pairs_for_targets(pair_sum_counts, targets):
+    return [count_pairs(pair_sum_counts, target) for target in targets]
+
 
-    print(answers)
+def read_numbers(f_input):
+    for line in f_input:
+        line = line.strip()
+        if line:
+            yield int(line)
 
 
-def puzzle_2(input_numbers):
-    answers = set()
-    for x in range(0, len(input_numbers)):
-        for y in range(0, len(input_numbers)):
-            for z in range(0, len(input_numbers)):
-                if x != y and x != z and (input_numbers[x] + input_numbers[y] + input_numbers[z] == 2020):
-                    answers.add(input_numbers[x] * input_numbers[y] * input_numbers[z])
+def stream_pair(input_filename, target=TARGET):
+    # Reads entries one at a time ('-' for stdin) and stops as soon as the matching pair has been seen.
+    if input_filename == '-':
+        return find_pair(read_numbers(sys.stdin), target)
 
-    print(answers)
+    with open(input_filename, 'r') as f_input:
+        return find_pair(read_numbers(f_input), target)
 
 
 if __name__ == '__main__':
     input_data = advent_utils.load_input_from_file('inputs/input_01.txt')
     input_numbers = sorted([int(line) for line in input_data])
 
-    puzzle_1(input_numbers)
-    puzzle_2(input_numbers)
+    print('puzzle_1: {s}'.format(s=puzzle_1(input_numbers)))
+    # print('puzzle_1 (streaming): {s}'.format(s=stream_pair('inputs/input_01.txt')))
+    print('puzzle_2: {s}'.format(s=puzzle_2(input_numbers)))
@@ -56,63 +56,306 @@ How many passwords are valid according to the new interpretation of the policies
 Your puzzle answer was 649.
 """
 
-import advent_utils
+from array import array
+import multiprocessing
+import os
+import re
 
+import numpy as np
 
-def puzzle_1(input_rules):
-    valid_rules = 0
+RULE_PATTERN = re.compile(r'(\d+)\s*-\s*(\d+)\s+(\S)\s*:\s*(\S*)')
 
-    for input_rule in input_rules:
-        if is_p1_rule_valid(input_rule):
-            valid_rules += 1
+LETTER_A = ord('a')
+LETTERS = 26
+HISTOGRAM_BLOCK_ROWS = 1 << 16
 
-    print(valid_rules)
 
+def puzzle_1(password_db):
+    return count_valid_passwords(password_db, {'puzzle_1': is_p1_rule_valid})['puzzle_1']
 
-def puzzle_2(input_rules):
-    valid_passwords = 0
 
-    for input_rule in input_rules:
-        if is_p2_password_valid(input_rule):
-            valid_passwords += 1
+def puzzle_2(password_db):
+    return count_valid_passwords(password_db, {'puzzle_2': is_p2_password_valid})['puzzle_2']
 
-    print(valid_passwords)
 
+def load_password_db_from_file(input_filename):
+    with open(input_filename, 'r') as f_input:
+        return load_password_db(f_input.read())
 
-def get_password_rule(string_):
-    rule_fields = string_.replace(':', '').split(' ')
-    return rule_fields
 
+def load_password_db(text):
+    # Decodes every rule in a single pass into columns: lows, highs, chars and passwords. Blank lines are skipped and
+    # a line that is not a rule raises ValueError instead of being dropped.
+    password_db = {
+        'lows': array('I'),
+        'highs': array('I'),
+        'chars': [],
+        'passwords': [],
+    }
 
-def is_p1_rule_valid(input_rule):
-    range_ = input_rule[0].split('-')
-    low = int(range_[0])
-    high = int(range_[1])
-    character = input_rule[1]
-    password = input_rule[2]
+    lows_append = password_db['lows'].append
+    highs_append = password_db['highs'].append
+    chars_append = password_db['chars'].append
+    passwords_append = password_db['passwords'].append
 
-    if low <= password.count(character) and password.count(character) <= high:
-        return True
-    return False
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
 
+        match = RULE_PATTERN.fullmatch(line)
+        if match is None:
+            raise ValueError('Invalid password rule on line {n}: {l!r}'.format(n=line_number, l=line))
 
-def is_p2_password_valid(input_rule):
-    range_ = input_rule[0].split('-')
-    pos1 = int(range_[0]) - 1
-    pos2 = int(range_[1]) - 1
-    character = input_rule[1]
-    password = input_rule[2]
+        low, high, character, password = match.groups()
+        lows_append(int(low))
+        highs_append(int(high))
+        chars_append(character)
+        passwords_append(password)
 
-    pass_pos1 = password[pos1] == character
-    pass_pos2 = password[pos2] == character
+    return password_db
+
+
+def is_p1_rule_valid(low, high, character, password):
+    return low <= password.count(character) <= high
+
+
+def is_p2_password_valid(pos1, pos2, character, password):
+    pass_pos1 = password[pos1 - 1] == character
+    pass_pos2 = password[pos2 - 1] == character
 
     # XOR
     return pass_pos1 != pass_pos2
 
 
+def are_p2_passwords_valid(password_db):
+    # Batch form of is_p2_password_valid; positions past the end of a password never match.
+    passwords = load_password_matrix(password_db['passwords'])
+    characters = np.frombuffer(''.join(password_db['chars']).encode(), dtype=np.uint8)
+    width = passwords.shape[1]
+
+    rows = np.arange(len(passwords))
+    pos1 = np.minimum(np.frombuffer(password_db['lows'], dtype=np.uint32).astype(np.intp) - 1, width - 1)
+    pos2 = np.minimum(np.frombuffer(password_db['highs'], dtype=np.uint32).astype(np.intp) - 1, width - 1)
+
+    return (passwords[rows, pos1] == characters) ^ (passwords[rows, pos2] == characters)
+
+
+def load_letter_histograms(password_db, block_rows=HISTOGRAM_BLOCK_ROWS):
+    # Per-password counters for the letters a-z (other characters count as absent), so count-range policies
+    # can be re-scored without the strings. Counts go straight into the uint16 result, block_rows passwords at a time,
+    # so building the cache needs no more than one block's byte matrix on top of it.
+    passwords = password_db['passwords']
+    histograms = np.zeros((len(passwords), LETTERS), dtype=np.uint16)
+    max_count = np.iinfo(np.uint16).max
+
+    for start in range(0, len(passwords), block_rows):
+        block = load_password_matrix(passwords[start: start + block_rows])
+        for letter in range(LETTERS):
+            counts = (block == LETTER_A + letter).sum(axis=1, dtype=np.uint32)
+            histograms[start: start + len(block), letter] = np.minimum(counts, max_count)
+
+    return histograms
+
+
+def are_count_ranges_valid(histograms, password_db, lows=None, highs=None):
+    # Batch form of is_p1_rule_valid from the histograms; lows and highs default to the database's own
+    # thresholds and may be replaced by any arrays (or scalars) to re-score the same passwords.
+    lows = np.frombuffer(password_db['lows'], dtype=np.uint32) if lows is None else lows
+    highs = np.frombuffer(password_db['highs'], dtype=np.uint32) if highs is None else highs
+    letters = np.frombuffer(''.join(password_db['chars']).encode(), dtype=np.uint8).astype(np.intp) - LETTER_A
+    is_letter = (letters >= 0) & (letters < LETTERS)
+    counts = np.where(is_letter, histograms[np.arange(len(histograms)), np.clip(letters, 0, LETTERS - 1)], 0)
+
+    return (lows <= counts) & (counts <= highs)
+
+
+def load_password_matrix(passwords):
+    # One zero-padded uint8 row per password, plus a trailing zero column for out-of-range positions.
+    encoded = [password.encode() for password in passwords]
+    width = max(map(len, encoded), default=0) + 1
+
+    return np.frombuffer(b''.join(password.ljust(width, b'\0') for password in encoded), dtype=np.uint8) \
+        .reshape(len(encoded), width)
+
+
+# Policies are callables taking one record (low, high, character, password). POLICY_KINDS names the reusable ones,
+# POLICIES holds the active set; the active set is compiled into a single predicate or counting loop.
+#
+# A policy may carry a `source` hook: an expression over low, high, character and password that gives the same result
+# as calling it. Hooks are inlined into the compiled code, so the hot loop makes no call for them at all; every hook
+# is checked against its callable on POLICY_PROBES before it is used.
+is_p1_rule_valid.source = 'low <= password.count(character) <= high'
+is_p2_password_valid.source = '(password[low - 1] == character) != (password[high - 1] == character)'
+
+POLICY_KINDS = {
+    'count_range': is_p1_rule_valid,
+    'positional_xor': is_p2_password_valid,
+}
+
+POLICIES = {
+    'puzzle_1': is_p1_rule_valid,
+    'puzzle_2': is_p2_password_valid,
+}
+
+POLICY_PROBES = [
+    (1, 3, 'a', 'abcde'),
+    (1, 3, 'b', 'cdefg'),
+    (2, 9, 'c', 'ccccccccc'),
+    (1, 2, 'b', 'ba'),
+    (2, 4, 'x', 'xxyx'),
+    (3, 3, 'q', 'qq'),
+    (1, 1, 'z', ''),
+]
+
+PREDICATE_TEMPLATE = """
+def evaluate(low, high, character, password):
+    return ({checks})
+"""
+
+COUNTER_TEMPLATE = """
+def count(lows, highs, chars, passwords):
+    {zero_counts}
+    for low, high, character, password in zip(lows, highs, chars, passwords):
+{increments}
+    return [{counts}]
+"""
+
+
+def register_policy_kind(kind, validator):
+    check_policy(validator)
+    POLICY_KINDS[kind] = validator
+
+
+def register_policy(name, validator):
+    # validator is a callable, or the name of a registered policy kind.
+    if isinstance(validator, str):
+        validator = POLICY_KINDS[validator]
+    check_policy(validator)
+    POLICIES[name] = validator
+
+
+def check_policy(validator):
+    # Rejects non-callables, and source hooks that do not compile or disagree with their callable on POLICY_PROBES
+    # (raising the same exception type counts as agreeing).
+    if not callable(validator):
+        raise TypeError('Policy is not callable: {v!r}'.format(v=validator))
+
+    source = getattr(validator, 'source', None)
+    if source is None:
+        return
+
+    expression = compile(source, '<day_02 policy>', 'eval')
+    for probe in POLICY_PROBES:
+        called = _probe_outcome(validator, *probe)
+        inlined = _probe_outcome(eval, expression, dict(zip(('low', 'high', 'character', 'password'), probe)))
+        if called != inlined:
+            raise ValueError('Policy source {s!r} disagrees with {v!r} on {p!r}: {i!r} != {c!r}'.format(
+                s=source, v=validator, p=probe, i=inlined, c=called))
+
+
+def _probe_outcome(function, *args):
+    try:
+        return bool(function(*args))
+    except Exception as e:
+        return type(e)
+
+
+def compile_policies(policies=None):
+    # Returns evaluate(low, high, character, password) -> one bool per policy, in the order of policies.
+    policies = POLICIES if policies is None else policies
+    namespace, checks = _policy_checks(list(policies.values()))
+    source = PREDICATE_TEMPLATE.format(checks=''.join('{c}, '.format(c=check) for check in checks))
+
+    return _compile_function(source, 'evaluate', namespace)
+
+
+def compile_policy_counter(validators):
+    # Returns count(lows, highs, chars, passwords) -> valid count per validator, with every check written out in the
+    # loop body, so there is no per-policy dispatch.
+    namespace, checks = _policy_checks(validators)
+    names = ['count_{i}'.format(i=i) for i in range(len(validators))]
+    source = COUNTER_TEMPLATE.format(
+        zero_counts=''.join('{n} = '.format(n=name) for name in names) + '0',
+        increments='\n'.join(
+            '        if {c}:\n            {n} += 1'.format(c=check, n=name) for name, check in zip(names, checks)
+        ) or '        pass',
+        counts=', '.join(names),
+    )
+
+    return _compile_function(source, 'count', namespace)
+
+
+def _policy_checks(validators):
+    # One expression per validator: its checked source hook, or else a call to it through a global of the
+    # generated function.
+    namespace = {}
+    checks = []
+    for idx, validator in enumerate(validators):
+        check_policy(validator)
+        source = getattr(validator, 'source', None)
+        if source is None:
+            namespace['check_{i}'.format(i=idx)] = validator
+            source = 'check_{i}(low, high, character, password)'.format(i=idx)
+        checks.append('({s})'.format(s=source))
+
+    return namespace, checks
+
+
+def _compile_function(source, function_name, namespace):
+    exec(compile(source, '<day_02 policies>', 'exec'), namespace)
+    return namespace[function_name]
+
+
+def count_valid_passwords(password_db, policies=None):
+    # Evaluates every policy in a single scan over the columns and returns the valid count per policy.
+    policies = POLICIES if policies is None else policies
+    count = compile_policy_counter(list(policies.values()))
+    counts = count(password_db['lows'], password_db['highs'], password_db['chars'], password_db['passwords'])
+
+    return dict(zip(policies, counts))
+
+
+def count_valid_passwords_parallel(input_filename, policies=None, processes=None, chunk_size=64 * 1024 * 1024):
+    # Each worker reads, parses and validates its own newline-aligned byte range, so the parent never loads the file.
+    policies = POLICIES if policies is None else policies
+    chunks = [(input_filename, start, end, policies) for start, end in get_chunk_offsets(input_filename, chunk_size)]
+    counts = dict.fromkeys(policies, 0)
+
+    with multiprocessing.Pool(processes) as pool:
+        for chunk_counts in pool.imap_unordered(_count_valid_passwords_in_chunk, chunks):
+            for name, count in chunk_counts.items():
+                counts[name] += count
+
+    return counts
+
+
+def get_chunk_offsets(input_filename, chunk_size):
+    file_size = os.path.getsize(input_filename)
+
+    with open(input_filename, 'rb') as f_input:
+        start = 0
+        while start < file_size:
+            f_input.seek(min(start + chunk_size, file_size))
+            f_input.readline()
+            end = min(f_input.tell(), file_size)
+            yield start, end
+            start = end
+
+
+def _count_valid_passwords_in_chunk(chunk):
+    input_filename, start, end, policies = chunk
+    with open(input_filename, 'rb') as f_input:
+        f_input.seek(start)
+        text = f_input.read(end - start).decode()
+
+    return count_valid_passwords(load_password_db(text), policies)
+
+
 if __name__ == '__main__':
-    input_data = advent_utils.load_input_from_file('inputs/input_02.txt')
-    input_rules = [get_password_rule(line) for line in input_data]
+    password_db = load_password_db_from_file('inputs/input_02.txt')
+
+    counts = count_valid_passwords(password_db)
 
-    puzzle_1(input_rules)
-    puzzle_2(input_rules)
+    print(counts['puzzle_1'])
+    print(counts['puzzle_2'])
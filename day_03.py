@@ -88,9 +88,20 @@ What do you get if you multiply together the number of trees encountered on each
 Your puzzle answer was 3064612320.
 """
 
+import math
+import mmap
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+
 import advent_utils
 
 TREE = '#'
+TREE_BITS = str.maketrans({TREE: '1', '.': '0'})
+
+SLOPES = [(1, 1), (3, 1), (5, 1), (7, 1), (1, 2)]
 
 
 def puzzle_1(the_map, right_increment, down_increment):
@@ -114,13 +125,207 @@ def puzzle_1(the_map, right_increment, down_increment):
 
 
 def puzzle_2(the_map):
-    r1_d1 = puzzle_1(the_map, 1, 1)
-    r3_d1 = puzzle_1(the_map, 3, 1)
-    r5_d1 = puzzle_1(the_map, 5, 1)
-    r7_d1 = puzzle_1(the_map, 7, 1)
-    r1_d2 = puzzle_1(the_map, 1, 2)
+    print(math.prod(count_trees_for_slopes(the_map, SLOPES)))
+
+
+def count_trees_for_slopes(the_map, slopes):
+    # Counts the trees on every (right, down) slope in a single top-to-bottom pass over the rows.
+    width = len(the_map[0])
+    trees_found = [0] * len(slopes)
+
+    for y in range(0, len(the_map)):
+        row = None
+        for idx, (right, down) in enumerate(slopes):
+            if y % down == 0:
+                # Rows no slope lands on are never read, which matters for a MappedMap.
+                row = row or the_map[y]
+                if row[(y // down * right) % width] == TREE:
+                    trees_found[idx] += 1
+
+    return trees_found
+
+
+def find_best_slope(the_map, max_right, max_down):
+    # Slope (right, down) with 1 <= right <= max_right and 1 <= down <= max_down crossing the fewest trees,
+    # returned as (right, down, trees). Slopes with the same right % width share a path, so each distinct
+    # path is walked once, and a walk stops as soon as it reaches the best count found so far.
+    width = len(the_map[0])
+    tree_columns = [frozenset(x for x, cell in enumerate(row) if cell == TREE) for row in the_map]
+
+    best = None
+    walked = {}
+    for right in range(1, max_right + 1):
+        for down in range(1, max_down + 1):
+            path = (right % width, down)
+            if path not in walked:
+                bound = best[2] if best else len(tree_columns) + 1
+                walked[path] = count_trees_with_bound(tree_columns, width, path[0], down, bound)
+
+            if best is None or walked[path] < best[2]:
+                best = (right, down, walked[path])
+
+    return best
+
+
+def count_trees_with_bound(tree_columns, width, right, down, bound):
+    # Stops counting once bound is reached, since the slope can no longer improve on the best one.
+    trees_found = 0
+    x = 0
+    for columns in tree_columns[::down]:
+        if x in columns:
+            trees_found += 1
+            if trees_found >= bound:
+                return trees_found
+        x = (x + right) % width
+
+    return trees_found
+
+
+def count_trees_parallel(the_map, slopes, processes=None, band_rows=None):
+    # The map is copied once into shared memory; the pool then works through (slope, row band) tasks, so slopes
+    # are spread across workers and a single slope can be split into bands of band_rows rows.
+    # Returns the per-slope tree counts and their product, as puzzle_2 computes it.
+    height = len(the_map)
+    width = len(the_map[0])
+    band_rows = band_rows or height
+    tasks = [
+        (idx, right, down, start, min(start + band_rows, height))
+        for idx, (right, down) in enumerate(slopes)
+        for start in range(0, height, band_rows)
+    ]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, height * width))
+    try:
+        shm.buf[:height * width] = ''.join(the_map).encode('ascii')
+
+        trees_found = [0] * len(slopes)
+        with multiprocessing.Pool(processes, initializer=_init_map_worker, initargs=(shm.name, width)) as pool:
+            for idx, trees in pool.imap_unordered(_count_trees_in_band, tasks):
+                trees_found[idx] += trees
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return trees_found, math.prod(trees_found)
+
+
+def _init_map_worker(shm_name, width):
+    global _worker_shm, _worker_width
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_width = width
+
+
+def _count_trees_in_band(task):
+    idx, right, down, start, stop = task
+    cells = _worker_shm.buf
+    width = _worker_width
+    tree = ord(TREE)
+
+    trees_found = 0
+    for y in range(-(-start // down) * down, stop, down):
+        if cells[y * width + (y // down * right) % width] == tree:
+            trees_found += 1
+
+    return idx, trees_found
+
+
+class MappedMap:
+    # Read-only, memory-mapped map with fixed-width rows. Rows are located from the line width and only decoded
+    # when indexed, so puzzle_1 and count_trees_for_slopes read just the rows a slope visits.
+
+    def __init__(self, input_filename):
+        self._file = open(input_filename, 'rb')
+        self._mmap = None
+        self.width = 0
+        self.line_width = 0
+        self.height = 0
+
+        # mmap cannot map an empty file; that map simply has no rows.
+        if os.fstat(self._file.fileno()).st_size == 0:
+            return
+
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        first_line = self._mmap.readline()
+        self.width = len(first_line.rstrip(b'\r\n'))
+        self.line_width = len(first_line)
+
+        # Trailing newlines (and blank lines) are not rows.
+        content_size = len(self._mmap)
+        while content_size > 0 and self._mmap[content_size - 1] in b'\r\n':
+            content_size -= 1
+        self.height = -(-content_size // self.line_width)
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        if y < 0 or y >= self.height:
+            raise IndexError('map row out of range')
+
+        start = y * self.line_width
+        return self._mmap[start: start + self.width].decode('ascii')
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_bitmask_map(the_map):
+    # The whole map packed into one bytes bitset: each row takes row_bytes = ceil(width / 8) bytes, little-endian,
+    # with bit x set when column x holds a tree.
+    width = len(the_map[0]) if the_map else 0
+    row_bytes = -(-width // 8)
+
+    return {
+        'width': width,
+        'height': len(the_map),
+        'row_bytes': row_bytes,
+        'bits': b''.join(int(row[::-1].translate(TREE_BITS), 2).to_bytes(row_bytes, 'little') for row in the_map),
+    }
+
+
+def count_trees_in_bitmask_map(bitmask_map, slopes):
+    width = bitmask_map['width']
+    row_bytes = bitmask_map['row_bytes']
+    bits = bitmask_map['bits']
+    trees_found = [0] * len(slopes)
+
+    for idx, (right, down) in enumerate(slopes):
+        x = 0
+        for y in range(0, bitmask_map['height'], down):
+            trees_found[idx] += (bits[y * row_bytes + (x >> 3)] >> (x & 7)) & 1
+            x = (x + right) % width
+
+    return trees_found
+
+
+def load_tree_matrix(the_map):
+    return np.array([[cell == TREE for cell in row] for row in the_map], dtype=bool)
+
+
+def count_trees_vectorized(tree_matrix, slopes):
+    # All slopes are flattened into one batch of (row, column) lookups; bincount then sums the hits per slope.
+    height, width = tree_matrix.shape
+    rights = np.array([right for right, _ in slopes], dtype=np.int64)
+    downs = np.array([down for _, down in slopes], dtype=np.int64)
+
+    steps_per_slope = -(-height // downs)
+    slope_idx = np.repeat(np.arange(len(slopes)), steps_per_slope)
+    step = np.arange(len(slope_idx)) - np.repeat(np.cumsum(steps_per_slope) - steps_per_slope, steps_per_slope)
+
+    hits = tree_matrix[step * downs[slope_idx], (step * rights[slope_idx]) % width]
 
-    print(r1_d1 * r3_d1 * r5_d1 * r7_d1 * r1_d2)
+    return np.bincount(slope_idx, weights=hits, minlength=len(slopes)).astype(np.int64).tolist()
 
 
 def move_right(curr_x, end_x, right_increment):
@@ -137,9 +137,28 @@ optional. In your batch file, how many passports are valid?
 Your puzzle answer was 194.
 """
 
+import math
+import multiprocessing
+import os
 import re
+import time
 
-import advent_utils
+import numpy as np
+
+PASSPORT_FIELDS = ('pid', 'byr', 'iyr', 'eyr', 'hgt', 'hcl', 'ecl', 'cid')
+REQUIRED_FIELDS = ('byr', 'iyr', 'eyr', 'hgt', 'hcl', 'ecl', 'pid')
+EYE_COLORS = ['amb', 'blu', 'brn', 'gry', 'grn', 'hzl', 'oth']
+HEX_DIGITS = '0123456789abcdefABCDEF'
+
+PASSPORT_SCHEMA = {
+    'byr': (r'(\d{4})()', {'': (1920, 2002)}),
+    'iyr': (r'(\d{4})()', {'': (2010, 2020)}),
+    'eyr': (r'(\d{4})()', {'': (2020, 2030)}),
+    'hgt': (r'(\d+)(cm|in)', {'cm': (150, 193), 'in': (59, 76)}),
+    'hcl': (r'#(?:[0-9a-fA-F]{3}){1,2}', None),
+    'ecl': (r'amb|blu|brn|gry|grn|hzl|oth', None),
+    'pid': (r'\d{9}', None),
+}
 
 
 def puzzle_1(passports):
@@ -154,51 +173,202 @@ def puzzle_1(passports):
 
 def puzzle_2(passports):
     valid_passport_count = 0
-    valid_passports = []
 
     for passport in passports:
         if is_valid_passport(passport) and all_passport_fields_valid(passport):
-            valid_passports.append(passport)
             valid_passport_count += 1
 
     print(valid_passport_count)
 
 
+def count_valid_passports_parallel(input_filename, processes=None, chunk_size=64 * 1024 * 1024, with_records=False):
+    # Each worker reads and validates its own shard of whole records, split at blank lines. Returns the counts for
+    # puzzle_1 ('present') and puzzle_2 ('valid'), plus the fully valid passports under 'passports' if requested.
+    offsets = get_record_chunk_offsets(input_filename, chunk_size)
+    chunks = [(input_filename, start, end, with_records) for start, end in offsets]
+    counts = {'present': 0, 'valid': 0}
+    if with_records:
+        counts['passports'] = []
+
+    with multiprocessing.Pool(processes) as pool:
+        for chunk_counts in pool.imap(_count_valid_passports_in_chunk, chunks):
+            counts['present'] += chunk_counts['present']
+            counts['valid'] += chunk_counts['valid']
+            if with_records:
+                counts['passports'].extend(chunk_counts['passports'])
+
+    return counts
+
+
+def get_record_chunk_offsets(input_filename, chunk_size):
+    file_size = os.path.getsize(input_filename)
+
+    with open(input_filename, 'rb') as f_input:
+        start = 0
+        while start < file_size:
+            f_input.seek(min(start + chunk_size, file_size))
+            f_input.readline()
+            # Move on to the end of the next blank line, so the chunk ends on a record boundary.
+            line = b'x'
+            while line.strip():
+                line = f_input.readline()
+            end = min(f_input.tell(), file_size)
+            yield start, end
+            start = end
+
+
+def _count_valid_passports_in_chunk(chunk):
+    input_filename, start, end, with_records = chunk
+    with open(input_filename, 'rb') as f_input:
+        f_input.seek(start)
+        lines = f_input.read(end - start).decode().splitlines()
+
+    counts = {'present': 0, 'valid': 0}
+    valid_passports = []
+    for passport in iter_passports(lines):
+        if is_valid_passport(passport):
+            counts['present'] += 1
+            if all_passport_fields_valid(passport):
+                counts['valid'] += 1
+                if with_records:
+                    valid_passports.append(passport)
+
+    if with_records:
+        counts['passports'] = valid_passports
+
+    return counts
+
+
 def load_passports_from_data(passport_data):
-    passports = []
+    return list(iter_passports(passport_data))
+
+
+def load_passports_from_file(input_filename):
+    with open(input_filename, 'r') as f_input:
+        yield from iter_passports(f_input)
+
+
+def iter_passports(lines):
+    # Yields one passport per blank-line-delimited record; lines can be any iterable, such as an open file.
+    for passport_data in iter_passport_records(lines):
+        yield load_passport_from_data(passport_data)
 
+
+def iter_passport_records(lines):
+    # Yields the 'key:value' items of each blank-line-delimited record.
     current_passport_data = []
-    for line in passport_data:
+    for line in lines:
+        line = line.strip()
         if line:
             current_passport_data.extend(line.split(' '))
-        elif not line and current_passport_data:
-            passports.append(load_passport_from_data(current_passport_data))
+        elif current_passport_data:
+            yield current_passport_data
             current_passport_data = []
 
-    passports.append(load_passport_from_data(current_passport_data))
+    if current_passport_data:
+        yield current_passport_data
+
+
+def load_passport_columns(lines):
+    # One numpy string column per passport field instead of one dict per record; missing fields are ''.
+    columns = {field: [] for field in PASSPORT_FIELDS}
+
+    for passport_count, passport_data in enumerate(iter_passport_records(lines), start=1):
+        for item in passport_data:
+            field, _, value = item.partition(':')
+            column = columns.get(field)
+            if column is None:
+                continue
+            if len(column) == passport_count:
+                column[-1] = value
+            else:
+                column.append(value)
+
+        for column in columns.values():
+            if len(column) < passport_count:
+                column.append('')
+
+    return {field: np.array(column, dtype=str) for field, column in columns.items()}
+
+
+def are_passports_valid(columns):
+    # Batch form of is_valid_passport over load_passport_columns.
+    return np.logical_and.reduce([np.char.str_len(columns[field]) > 0 for field in REQUIRED_FIELDS])
+
+
+def are_passport_fields_valid(columns):
+    # Batch form of all_passport_fields_valid: every rule runs over a whole column and the results are ANDed.
+    return are_years_valid(columns['byr'], 1920, 2002) & are_years_valid(columns['iyr'], 2010, 2020) \
+        & are_years_valid(columns['eyr'], 2020, 2030) & are_hgt_valid(columns['hgt']) \
+        & are_hcl_valid(columns['hcl']) & are_ecl_valid(columns['ecl']) & are_pid_valid(columns['pid'])
+
+
+def are_years_valid(column, min_value, max_value):
+    is_year = (np.char.str_len(column) == 4) & np.char.isdecimal(column)
+    years = np.where(is_year, column, '0').astype(np.int64)
+    return is_year & (years >= min_value) & (years <= max_value)
+
 
-    return passports
+def are_hgt_valid(column):
+    is_cm = np.char.endswith(column, 'cm')
+    is_in = np.char.endswith(column, 'in')
+    numbers = np.char.rstrip(column, 'cmin')
+    lengths = np.char.str_len(numbers)
+
+    is_height = (is_cm | is_in) & (lengths == np.char.str_len(column) - 2) & (lengths > 0) & (lengths <= 18) \
+        & np.char.isdecimal(numbers)
+    heights = np.where(is_height, numbers, '0').astype(np.int64)
+
+    return is_height & ((is_cm & (heights >= 150) & (heights <= 193)) | (is_in & (heights >= 59) & (heights <= 76)))
+
+
+def are_hcl_valid(column):
+    # '#' followed by 3 or 6 hex digits: stripping the hex digits from the right must leave just the '#'.
+    return np.char.startswith(column, '#') & np.isin(np.char.str_len(column), [4, 7]) \
+        & (np.char.str_len(np.char.rstrip(column, HEX_DIGITS)) == 1)
+
+
+def are_ecl_valid(column):
+    return np.isin(column, EYE_COLORS)
+
+
+def are_pid_valid(column):
+    return (np.char.str_len(column) == 9) & np.char.isdecimal(column)
 
 
 def load_passport_from_data(passport_data):
-    passport = {
-        'pid': '',
-        'byr': '',
-        'iyr': '',
-        'eyr': '',
-        'hgt': '',
-        'hcl': '',
-        'ecl': '',
-        'cid': '',
-    }
+    passport = Passport()
 
     for item in passport_data:
         props = item.split(':')
-        passport[props[0]] = props[1]
+        # A Passport only has slots for PASSPORT_FIELDS; any other key is skipped.
+        if props[0] in PASSPORT_FIELDS:
+            setattr(passport, props[0], props[1])
 
     return passport
 
 
+class Passport:
+    # Compact passport record: one slot per field instead of an 8-key dict. Fields are read with passport['byr'],
+    # just like the dicts the validators also accept, through the C-level attribute lookup.
+    __slots__ = PASSPORT_FIELDS
+
+    __getitem__ = object.__getattribute__
+
+    def __init__(self, pid='', byr='', iyr='', eyr='', hgt='', hcl='', ecl='', cid=''):
+        self.pid = pid
+        self.byr = byr
+        self.iyr = iyr
+        self.eyr = eyr
+        self.hgt = hgt
+        self.hcl = hcl
+        self.ecl = ecl
+        self.cid = cid
+
+    def __repr__(self):
+        return 'Passport({f})'.format(f=', '.join('{k}={v!r}'.format(k=k, v=self[k]) for k in PASSPORT_FIELDS))
+
+
 def is_valid_passport(passport):
     if passport['byr'] != '' and passport['iyr'] != '' and passport['eyr'] != '' and passport['hgt'] != '' \
             and passport['hcl'] != '' and passport['ecl'] != '' and passport['pid'] != '':
@@ -272,6 +442,87 @@ def validate_year(value, min_value, max_value):
     return value >= min_value and value <= max_value
 
 
+FIELD_RULES = {
+    'byr': is_byr,
+    'iyr': is_iyr,
+    'eyr': is_eyr,
+    'hgt': is_hgt,
+    'hcl': is_hcl,
+    'ecl': is_ecl,
+    'pid': is_pid,
+}
+
+
+class AdaptiveFieldValidator:
+    # Same result as all_passport_fields_valid, but it counts how often each field rule runs ('hits'), how often it
+    # rejects and how long it takes, and every reorder_interval records re-sorts the short-circuit chain so rules
+    # with the most rejects per second of run time go first.
+
+    def __init__(self, rules=None, reorder_interval=1000):
+        self.rules = dict(FIELD_RULES if rules is None else rules)
+        self.order = list(self.rules)
+        self.stats = {field: {'hits': 0, 'rejects': 0, 'time': 0.0} for field in self.rules}
+        self.reorder_interval = reorder_interval
+        self.evaluated = 0
+
+    def __call__(self, passport):
+        valid = True
+        for field in self.order:
+            stats = self.stats[field]
+            start = time.perf_counter()
+            passed = self.rules[field](passport[field])
+            stats['time'] += time.perf_counter() - start
+            stats['hits'] += 1
+            if not passed:
+                stats['rejects'] += 1
+                valid = False
+                break
+
+        self.evaluated += 1
+        if self.evaluated % self.reorder_interval == 0:
+            self.reorder()
+
+        return valid
+
+    def reorder(self):
+        self.order.sort(key=self._selectivity_per_second, reverse=True)
+
+    def _selectivity_per_second(self, field):
+        stats = self.stats[field]
+        if stats['time'] == 0:
+            return math.inf if stats['rejects'] else 0.0
+
+        return stats['rejects'] / stats['time']
+
+
+def compile_passport_schema(schema):
+    # Turns a schema of field -> (pattern, ranges) into a single record validator. All field patterns are joined
+    # into one precompiled pattern, matched once against the record's values joined by newlines (values never
+    # contain one). When a field has ranges, its pattern captures (number, unit) and ranges maps each unit to its
+    # (min, max); other patterns must not capture, so the ranges line up with the captured groups in order.
+    fields = tuple(schema)
+    record_pattern = re.compile('\n'.join('(?:{p})'.format(p=pattern) for pattern, _ in schema.values()))
+    range_table = tuple(ranges for _, ranges in schema.values() if ranges is not None)
+
+    def validate_passport(passport):
+        match = record_pattern.fullmatch('\n'.join([passport[field] for field in fields]))
+        if match is None:
+            return False
+
+        groups = match.groups()
+        for idx, ranges in enumerate(range_table):
+            min_value, max_value = ranges[groups[2 * idx + 1]]
+            if not min_value <= int(groups[2 * idx]) <= max_value:
+                return False
+
+        return True
+
+    return validate_passport
+
+
+is_passport_schema_valid = compile_passport_schema(PASSPORT_SCHEMA)
+
+
 def _test_validations():
     print('\nis_byr')
     assert is_byr('2002'), 'Error asserting byr valid: 2002'
@@ -318,6 +569,7 @@ def _test_passports():
         'byr': '1926',
     }
     assert all_passport_fields_valid(ip1) is False, 'Assert ip1 failed'
+    assert is_passport_schema_valid(ip1) is False, 'Assert ip1 failed (schema)'
 
     ip2 = {
         'iyr': '2019',
@@ -329,6 +581,7 @@ def _test_passports():
         'byr': '1946',
     }
     assert all_passport_fields_valid(ip2) is False, 'Assert ip2 failed'
+    assert is_passport_schema_valid(ip2) is False, 'Assert ip2 failed (schema)'
 
     ip3 = {
         'hcl': 'dab227',
@@ -341,6 +594,7 @@ def _test_passports():
         'cid': '277',
     }
     assert all_passport_fields_valid(ip3) is False, 'Assert ip3 failed'
+    assert is_passport_schema_valid(ip3) is False, 'Assert ip3 failed (schema)'
 
     ip4 = {
         'hgt': '59cm',
@@ -352,6 +606,7 @@ def _test_passports():
         'byr': '2007',
     }
     assert all_passport_fields_valid(ip4) is False, 'Assert ip4 failed'
+    assert is_passport_schema_valid(ip4) is False, 'Assert ip4 failed (schema)'
 
     print('Valid passports')
 
@@ -365,6 +620,7 @@ def _test_passports():
         'hcl': '#623a2f',
     }
     assert all_passport_fields_valid(vp1), 'Assert vp1 failed'
+    assert is_passport_schema_valid(vp1), 'Assert vp1 failed (schema)'
 
     vp2 = {
         'eyr': '2029',
@@ -377,6 +633,7 @@ def _test_passports():
         'hgt': '165cm',
     }
     assert all_passport_fields_valid(vp2), 'Assert vp2 failed'
+    assert is_passport_schema_valid(vp2), 'Assert vp2 failed (schema)'
 
     vp3 = {
         'hcl': '#888785',
@@ -389,6 +646,7 @@ def _test_passports():
         'eyr': '2022',
     }
     assert all_passport_fields_valid(vp3), 'Assert vp3 failed'
+    assert is_passport_schema_valid(vp3), 'Assert vp3 failed (schema)'
 
     vp4 = {
         'iyr': '2010',
@@ -400,14 +658,27 @@ def _test_passports():
         'pid': '093154719',
     }
     assert all_passport_fields_valid(vp4), 'Assert vp4 failed'
+    assert is_passport_schema_valid(vp4), 'Assert vp4 failed (schema)'
+
+    print('Custom schemas')
+
+    pid_only = compile_passport_schema({'pid': (r'\d{9}', None)})
+    assert pid_only({'pid': '000000001'}), 'Assert pid-only schema valid failed'
+    assert pid_only({'pid': '00000001'}) is False, 'Assert pid-only schema invalid failed'
+
+    height_and_eyes = compile_passport_schema({
+        'ecl': (r'blu|grn', None),
+        'hgt': (r'(\d+)(cm)', {'cm': (100, 120)}),
+    })
+    assert height_and_eyes({'ecl': 'blu', 'hgt': '110cm'}), 'Assert custom schema valid failed'
+    assert height_and_eyes({'ecl': 'brn', 'hgt': '110cm'}) is False, 'Assert custom schema ecl failed'
+    assert height_and_eyes({'ecl': 'grn', 'hgt': '150cm'}) is False, 'Assert custom schema hgt failed'
 
 
 if __name__ == '__main__':
-    input_data = advent_utils.load_input_from_file('inputs/input_04.txt')
-    # input_data = advent_utils.load_input_from_file('inputs/test_04.txt')
+    input_filename = 'inputs/input_04.txt'
+    # input_filename = 'inputs/test_04.txt'
 
     # _test_validations()
-    passports = load_passports_from_data(input_data)
-
-    puzzle_1(passports)
-    puzzle_2(passports)
+    puzzle_1(load_passports_from_file(input_filename))
+    puzzle_2(load_passports_from_file(input_filename))
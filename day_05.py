@@ -69,9 +69,10 @@ What is the ID of your seat?
 Your puzzle answer was 524.
 """
 
+from itertools import repeat
+
 import advent_utils
 
-AIRPLANE_ROWS = 128
 AIRPLANE_COLS = 8
 
 BACK = 'B'
@@ -79,6 +80,9 @@ FRONT = 'F'
 RIGHT = 'R'
 LEFT = 'L'
 
+COL_BITS = 3
+SEAT_BITS = str.maketrans({BACK: '1', FRONT: '0', RIGHT: '1', LEFT: '0'})
+
 
 def puzzle_1(boarding_passes):
     max_id = 0
@@ -109,31 +113,29 @@ def load_boarding_passes_from_data(input_data):
 
 
 def load_boarding_pass_from_data(boarding_pass_data):
-    row = get_position(boarding_pass_data[:7], 0, 0, AIRPLANE_ROWS, BACK, FRONT)
-    col = get_position(boarding_pass_data[-3:], 0, 0, AIRPLANE_COLS, RIGHT, LEFT)
+    seat_id = get_seat_id(boarding_pass_data)
 
     boarding_pass = {
-        'row': row,
-        'column': col,
-        'seat_id': row * 8 + col,
+        'row': seat_id >> COL_BITS,
+        'column': seat_id & (AIRPLANE_COLS - 1),
+        'seat_id': seat_id,
     }
 
     return boarding_pass
 
 
-def get_position(seat_data, seat_data_idx, start, stop, left_bound, right_bound):
-    if start == stop - 1:
-        return start
-    else:
-        delta = int((stop - start) / 2)
-        if seat_data[seat_data_idx] == left_bound:
-            start += delta
-        elif seat_data[seat_data_idx] == right_bound:
-            stop -= delta
+def get_seat_id(boarding_pass_data):
+    # The pass is the seat ID in binary: B and R are 1 bits, F and L are 0 bits.
+    return int(boarding_pass_data.translate(SEAT_BITS), 2)
+
 
-        seat_data_idx = seat_data_idx + 1
+def get_seat_ids(input_data):
+    # Batch form of get_seat_id: a single translate over all passes, then one int() per pass. Like get_seat_id, a
+    # blank pass raises ValueError instead of being skipped, so the IDs always line up with the passes.
+    if not input_data:
+        return []
 
-        return get_position(seat_data, seat_data_idx, start, stop, left_bound, right_bound)
+    return list(map(int, '\n'.join(input_data).translate(SEAT_BITS).split('\n'), repeat(2)))
 
 
 if __name__ == '__main__':